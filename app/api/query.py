@@ -1,5 +1,10 @@
 """问答 API"""
+import asyncio
+import orjson
+from typing import Any, Dict, Iterator
 from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from app.rag_service import RAGService
 from app.models import QueryRequest, QueryResponse
 
@@ -20,7 +25,9 @@ async def query_document_with_service(
         查询响应
     """
     try:
-        answer, relevant_chunks = rag_service.query(
+        # 检索与生成均为阻塞调用，放到线程池执行，使并发查询可以同时进行
+        answer, relevant_chunks = await asyncio.to_thread(
+            rag_service.query,
             question=request.question,
             top_k=request.top_k or 3
         )
@@ -34,3 +41,51 @@ async def query_document_with_service(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
 
+
+def _sse_event(payload: Dict[str, Any]) -> str:
+    """编码一条 Server-Sent Events 消息"""
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+
+# 流式查询处理函数，在 main.py 中直接调用
+async def stream_document_with_service(
+    request: QueryRequest,
+    rag_service: RAGService
+) -> StreamingResponse:
+    """
+    带 RAG 服务的流式文档查询处理函数
+    
+    依次推送 chunks（相关文档块）、token（回答片段）和 done/error 事件。
+    
+    Args:
+        request: 查询请求
+        rag_service: RAG 服务实例
+        
+    Returns:
+        text/event-stream 流式响应
+    """
+    try:
+        answer_stream, relevant_chunks = await asyncio.to_thread(
+            rag_service.query_stream,
+            question=request.question,
+            top_k=request.top_k or 3
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
+    
+    def event_stream() -> Iterator[str]:
+        yield _sse_event({
+            "type": "chunks",
+            "question": request.question,
+            "model": rag_service.model,
+            "relevant_chunks": jsonable_encoder(relevant_chunks)
+        })
+        try:
+            for piece in answer_stream:
+                yield _sse_event({"type": "token", "content": piece})
+        except Exception as e:
+            yield _sse_event({"type": "error", "message": f"查询失败: {str(e)}"})
+            return
+        yield _sse_event({"type": "done"})
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
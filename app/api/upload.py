@@ -1,20 +1,26 @@
 """文档上传 API"""
+import asyncio
+import os
 import uuid
 from pathlib import Path
 from datetime import datetime
+import aiofiles
 from fastapi import UploadFile, HTTPException
-from typing import Literal
+from typing import List, Literal
 
 from app.config import (
     DOCUMENTS_DIR,
     SUPPORTED_FILE_TYPES,
     MAX_FILE_SIZE,
+    UPLOAD_READ_CHUNK_SIZE,
+    UPLOAD_CONCURRENCY,
     CHUNK_SIZE,
-    CHUNK_OVERLAP
+    CHUNK_OVERLAP,
+    INGEST_BATCH_SIZE
 )
 from app.document_processor import process_document
 from app.vector_store import VectorStore
-from app.models import UploadResponse
+from app.models import UploadResponse, BatchUploadResponse, BatchUploadError
 
 def get_file_type(filename: str) -> Literal["pdf", "txt"]:
     """根据文件名获取文件类型"""
@@ -56,29 +62,44 @@ async def upload_document_with_store(
             detail=f"不支持的文件类型，仅支持: {', '.join(SUPPORTED_FILE_TYPES)}"
         )
     
-    # 2. 验证文件大小
-    file_content = await file.read()
-    if len(file_content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"文件大小超过限制 ({MAX_FILE_SIZE / 1024 / 1024}MB)"
-        )
-    
-    # 3. 保存文件
+    # 2. 保存文件（分块流式写入临时文件，超出大小限制时立即中止）
     document_id = str(uuid.uuid4())
     file_extension = Path(file.filename).suffix
     saved_filename = f"{document_id}{file_extension}"
     saved_path = DOCUMENTS_DIR / saved_filename
+    tmp_path = saved_path.with_suffix(".tmp")
+    
+    file_size = 0
+    try:
+        async with aiofiles.open(tmp_path, "wb") as f:
+            while data := await file.read(UPLOAD_READ_CHUNK_SIZE):
+                file_size += len(data)
+                if file_size > MAX_FILE_SIZE:
+                    break
+                await f.write(data)
+    except Exception as e:
+        tmp_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=f"文件保存失败: {str(e)}")
+    
+    # 3. 验证文件大小
+    if file_size > MAX_FILE_SIZE:
+        tmp_path.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=400,
+            detail=f"文件大小超过限制 ({MAX_FILE_SIZE / 1024 / 1024}MB)"
+        )
     
+    # 文件仅作处理前的暂存，不做 fsync，写完后原子替换为正式文件名
     try:
-        with open(saved_path, "wb") as f:
-            f.write(file_content)
+        os.replace(tmp_path, saved_path)
     except Exception as e:
+        tmp_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"文件保存失败: {str(e)}")
     
-    # 4. 处理文档
+    # 4. 处理文档（CPU 密集，放到线程池执行，避免阻塞事件循环）
     try:
-        text, chunks = process_document(
+        text, chunks = await asyncio.to_thread(
+            process_document,
             file_path=saved_path,
             file_type=file_type,
             chunk_mode=chunk_mode,
@@ -89,27 +110,28 @@ async def upload_document_with_store(
         saved_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"文档处理失败: {str(e)}")
     
-    # 5. 生成向量并存储
+    # 5. 生成向量并存储（按批写入，限制单次编码与写入的内存占用）
+    upload_time = datetime.now().isoformat()
     try:
-        documents = [chunk[0] for chunk in chunks]
-        metadata_list = [
-            {
-                "document_id": document_id,
-                "filename": file.filename,
-                "file_type": file_type,
-                "chunk_index": i,
-                "chunk_start": chunk[1],
-                "upload_time": datetime.now().isoformat()
-            }
-            for i, chunk in enumerate(chunks)
-        ]
-        chunk_ids = [f"{document_id}_chunk_{i}" for i in range(len(chunks))]
-        
-        vector_store.add_documents(
-            documents=documents,
-            metadata=metadata_list,
-            ids=chunk_ids
-        )
+        for tile_start in range(0, len(chunks), INGEST_BATCH_SIZE):
+            tile = chunks[tile_start:tile_start + INGEST_BATCH_SIZE]
+            await asyncio.to_thread(
+                vector_store.add_documents,
+                documents=[chunk[0] for chunk in tile],
+                metadata=[
+                    {
+                        "document_id": document_id,
+                        "filename": file.filename,
+                        "file_type": file_type,
+                        "chunk_index": i,
+                        "chunk_start": chunk[1],
+                        "chunks_count": len(chunks),
+                        "upload_time": upload_time
+                    }
+                    for i, chunk in enumerate(tile, tile_start)
+                ],
+                ids=[f"{document_id}_chunk_{i}" for i in range(tile_start, tile_start + len(tile))]
+            )
         
         return UploadResponse(
             success=True,
@@ -120,6 +142,52 @@ async def upload_document_with_store(
             message="文档上传并向量化成功"
         )
     except Exception as e:
+        # 清理已写入的部分分块
+        await asyncio.to_thread(
+            vector_store.delete_documents_by_filter,
+            {"document_id": document_id}
+        )
         saved_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"向量存储失败: {str(e)}")
 
+
+# 批量上传处理函数，在 main.py 中直接调用
+async def upload_documents_with_store(
+    files: List[UploadFile],
+    chunk_mode: Literal["chunked", "full"],
+    vector_store: VectorStore
+) -> BatchUploadResponse:
+    """
+    并发处理多个文件的上传，同时处理的文件数不超过 UPLOAD_CONCURRENCY
+    
+    Args:
+        files: 上传的文件列表
+        chunk_mode: 文档处理模式
+        vector_store: 向量存储实例
+        
+    Returns:
+        批量上传结果，单个文件失败不影响其他文件
+    """
+    semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+    
+    async def upload_one(file: UploadFile) -> UploadResponse:
+        async with semaphore:
+            return await upload_document_with_store(file, chunk_mode, vector_store)
+    
+    outcomes = await asyncio.gather(
+        *(upload_one(file) for file in files),
+        return_exceptions=True
+    )
+    
+    results = []
+    errors = []
+    for file, outcome in zip(files, outcomes):
+        if isinstance(outcome, HTTPException):
+            errors.append(BatchUploadError(filename=file.filename, detail=str(outcome.detail)))
+        elif isinstance(outcome, BaseException):
+            # 包括被取消的子任务（CancelledError 不是 Exception 的子类）
+            errors.append(BatchUploadError(filename=file.filename, detail=str(outcome) or type(outcome).__name__))
+        else:
+            results.append(outcome)
+    
+    return BatchUploadResponse(success=not errors, results=results, errors=errors)
@@ -9,11 +9,38 @@ BASE_DIR = Path(__file__).parent.parent
 # 向量模型配置
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 EMBEDDING_DIMENSION = 384
+# 推理后端："torch"（默认）、"onnx" 或 "openvino"，后两者需安装 sentence-transformers[onnx] / [openvino]
+EMBEDDING_BACKEND: Literal["torch", "onnx", "openvino"] = os.getenv("EMBEDDING_BACKEND", "torch")
+# 非 torch 后端加载的模型文件，如 "onnx/model_qint8_avx512_vnni.onnx"（int8 VNNI 量化），留空使用默认文件
+EMBEDDING_MODEL_FILE = os.getenv("EMBEDDING_MODEL_FILE", "")
+# 推理设备（cpu / cuda / cuda:0 等），为空时自动检测；torch 后端在 GPU 上以 fp16 推理
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "")
+# 是否用 torch.compile 编译 torch 后端的模型（首次启动编译较慢）
+EMBEDDING_COMPILE = os.getenv("EMBEDDING_COMPILE", "false").lower() == "true"
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))  # 单次 encode 的批大小
+EMBEDDING_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", "0"))  # CPU 多进程编码的进程数，0 表示不启用
+EMBEDDING_NUM_THREADS = int(os.getenv("EMBEDDING_NUM_THREADS", "0"))  # 推理线程数，0 表示使用默认值
+# 持久化向量缓存（按模型和文本 SHA-256 缓存向量，重复文本无需再次推理）
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = BASE_DIR / "embedding_cache.db"
+# 缓存条数上限，超出后淘汰最久未使用的条目（每条约 1.5KB）
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))  # 并发查询合并编码的最大条数
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))  # 并发查询的合并等待时间（毫秒）
+
+# 向量存储后端："chroma"（默认）或 "faiss"
+VECTOR_STORE_BACKEND: Literal["chroma", "faiss"] = os.getenv("VECTOR_STORE_BACKEND", "chroma")
 
 # ChromaDB 配置
 CHROMA_DB_PATH = BASE_DIR / "chroma_db"
 COLLECTION_NAME = "knowledge_base"
 
+# FAISS 配置
+FAISS_INDEX_DIR = BASE_DIR / "faiss_index"
+# 索引类型："hnsw"（float32 存储）或 "hnsw_sq8"（int8 标量量化，内存约为 1/4）
+FAISS_INDEX_TYPE: Literal["hnsw", "hnsw_sq8"] = os.getenv("FAISS_INDEX_TYPE", "hnsw")
+FAISS_RERANK_FACTOR = int(os.getenv("FAISS_RERANK_FACTOR", "4"))  # hnsw_sq8 粗排候选数为 top_k 的倍数
+
 # 文档存储配置
 DOCUMENTS_DIR = BASE_DIR / "data" / "documents"
 DOCUMENTS_DIR.mkdir(parents=True, exist_ok=True)
@@ -25,11 +52,21 @@ OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5:7b")
 # 文档分块配置
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "500"))  # 分块大小（字符数）
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "50"))  # 重叠大小（字符数）
+INGEST_BATCH_SIZE = 256  # 入库时每批写入向量存储的分块数
 
 # 向量检索配置
 TOP_K = int(os.getenv("TOP_K", "3"))  # 检索返回的文档块数量
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "512"))  # 查询向量缓存条数
+
+# HNSW 索引配置（M 与 construction_ef 仅在创建集合时生效）
+HNSW_M = 16  # 每个节点的最大邻居数
+HNSW_CONSTRUCTION_EF = 200  # 建图时的候选队列大小，越大图质量越好、检索所需 ef 越小
+# 检索时的候选队列大小：越大召回越高、延迟越大，启动时同步到已有集合
+HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", str(max(32, 4 * TOP_K))))
 
 # 文件类型
 SUPPORTED_FILE_TYPES: list[Literal["pdf", "txt"]] = ["pdf", "txt"]
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+UPLOAD_READ_CHUNK_SIZE = 1024 * 1024  # 上传文件分块读写大小（1MB）
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))  # 批量上传时同时处理的文件数
 
@@ -1,8 +1,7 @@
 """文档处理模块"""
-import re
 from pathlib import Path
 from typing import List, Dict, Literal, Tuple
-from pypdf import PdfReader
+import fitz  # PyMuPDF
 
 
 def process_pdf(file_path: Path) -> str:
@@ -16,13 +15,9 @@ def process_pdf(file_path: Path) -> str:
         提取的文本内容
     """
     try:
-        reader = PdfReader(file_path)
-        text_parts = []
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                text_parts.append(text)
-        return "\n\n".join(text_parts)
+        with fitz.open(file_path) as doc:
+            text_parts = [page.get_text("text") for page in doc]
+        return "\n\n".join(filter(None, text_parts))
     except Exception as e:
         raise ValueError(f"PDF 处理失败: {str(e)}")
 
@@ -65,28 +60,15 @@ def chunk_text(
     if not text:
         return []
     
-    # 清理文本：移除多余空白
-    text = re.sub(r'\s+', ' ', text.strip())
+    step = chunk_size - overlap
+    if step <= 0:
+        raise ValueError("重叠大小必须小于分块大小")
     
-    chunks = []
-    start = 0
-    text_length = len(text)
+    # 清理文本：移除多余空白（split/join 为单次 C 实现扫描，与 \s+ 正则替换等价）
+    text = " ".join(text.split())
     
-    while start < text_length:
-        end = start + chunk_size
-        chunk = text[start:end]
-        
-        if chunk:
-            chunks.append((chunk, start))
-        
-        # 移动到下一个块的起始位置（考虑重叠）
-        start = end - overlap
-        
-        # 避免无限循环
-        if start >= text_length:
-            break
-    
-    return chunks
+    # 起始位置按固定步长生成，直接切片得到各分块
+    return [(text[start:start + chunk_size], start) for start in range(0, len(text), step)]
 
 
 def process_document(
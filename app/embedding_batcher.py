@@ -0,0 +1,108 @@
+"""查询向量微批处理模块"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """
+    将并发到达的单条查询合并为一批统一编码
+    
+    后台线程取到第一条请求后，在 window_ms 时间窗口内继续收集（最多 max_batch 条），
+    调用一次 encode_fn 后再把结果分发给各个请求。embed() 可在任意线程中调用。
+    """
+    
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], np.ndarray],
+        max_batch: int = 32,
+        window_ms: float = 5.0
+    ):
+        self._encode_fn = encode_fn
+        self._max_batch = max_batch
+        self._window = window_ms / 1000
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._closed = False
+        # 保证关闭后不会再有请求排在结束标记之后
+        self._close_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+    
+    def embed(self, text: str) -> np.ndarray:
+        """
+        生成单条文本的向量（阻塞直到所在批次编码完成）
+        
+        Args:
+            text: 输入文本
+            
+        Returns:
+            文本向量
+        """
+        future: Future = Future()
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("向量批处理器已关闭")
+            self._queue.put((text, future))
+        return future.result()
+    
+    def close(self):
+        """停止后台线程，已提交的请求会先处理完"""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+    
+    def _run(self):
+        """后台线程：收集一批请求并编码，退出前让仍在排队的请求失败，避免调用方永久阻塞"""
+        try:
+            self._collect()
+        finally:
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[1].set_exception(RuntimeError("向量批处理器已关闭"))
+    
+    def _collect(self):
+        """循环收集一批请求并编码，遇到结束标记时返回"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self._window
+            while len(batch) < self._max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            
+            self._process(batch)
+            if stop:
+                return
+    
+    def _process(self, batch: List[Tuple[str, Future]]):
+        """编码一批文本并把结果写回各自的 Future"""
+        try:
+            embeddings = self._encode_fn([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        for (_, future), embedding in zip(batch, embeddings):
+            future.set_result(embedding)
@@ -0,0 +1,137 @@
+"""向量缓存模块"""
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+
+# SQLite 单条语句的参数数量上限（旧版本为 999）
+_SQLITE_MAX_PARAMS = 900
+# 命中条目的使用时间早于该间隔（秒）才刷新，避免每次命中都写库
+_TOUCH_INTERVAL = 3600
+
+
+class EmbeddingCache:
+    """
+    基于 SQLite 的持久化向量缓存
+    
+    以 (模型标识, SHA-256(文本)) 为键保存 float32 向量的原始字节，
+    命中时无需再次运行模型。条目数超过 max_entries 后按最近使用时间淘汰，
+    一次淘汰到上限的 90%，避免每次写入都触发清理。
+    """
+    
+    def __init__(self, db_path: Path, model_name: str, max_entries: int = 100000):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 只在检查点时 fsync，断电最多丢失最近写入的缓存条目
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, key BLOB NOT NULL, vec BLOB NOT NULL, "
+            "last_used REAL NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (model, key))"
+        )
+        # 兼容未记录使用时间的旧缓存文件
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if "last_used" not in columns:
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        # 条目数的估计值（覆盖写入时偏大），超过上限时再精确统计
+        self._approx_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    
+    @staticmethod
+    def _key(text: str) -> bytes:
+        """计算文本的缓存键"""
+        return hashlib.sha256(text.encode("utf-8")).digest()
+    
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        批量查询缓存
+        
+        Args:
+            texts: 文本列表
+            
+        Returns:
+            与 texts 一一对应的向量列表，未命中的位置为 None
+        """
+        keys = [self._key(text) for text in texts]
+        found = {}
+        stale = []
+        stale_before = time.time() - _TOUCH_INTERVAL
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_MAX_PARAMS):
+                batch = keys[start:start + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vec, last_used FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                    [self.model_name, *batch]
+                ).fetchall()
+                for key, vec, last_used in rows:
+                    found[key] = vec
+                    if last_used < stale_before:
+                        stale.append(key)
+            if stale:
+                self._touch(stale)
+        return [
+            np.frombuffer(found[key], dtype=np.float32) if key in found else None
+            for key in keys
+        ]
+    
+    def put_many(self, texts: List[str], embeddings: np.ndarray):
+        """
+        批量写入缓存
+        
+        Args:
+            texts: 文本列表
+            embeddings: 对应的向量矩阵
+        """
+        now = time.time()
+        rows = [
+            (self.model_name, self._key(text), np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, vec, last_used) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._approx_count += len(rows)
+            if self._approx_count > self.max_entries:
+                self._evict()
+            self._conn.commit()
+    
+    def _touch(self, keys: List[bytes]):
+        """更新命中条目的最近使用时间（调用方需持有锁）"""
+        now = time.time()
+        for start in range(0, len(keys), _SQLITE_MAX_PARAMS):
+            batch = keys[start:start + _SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            self._conn.execute(
+                f"UPDATE embeddings SET last_used = ? WHERE model = ? AND key IN ({placeholders})",
+                [now, self.model_name, *batch]
+            )
+        self._conn.commit()
+    
+    def _evict(self):
+        """淘汰最久未使用的条目，直到条目数降到上限的 90%（调用方需持有锁）"""
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count > self.max_entries:
+            target = int(self.max_entries * 0.9)
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                [count - target]
+            )
+            count = target
+        self._approx_count = count
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
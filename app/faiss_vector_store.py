@@ -0,0 +1,515 @@
+"""FAISS 向量存储模块"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Optional, Any, Set
+import faiss
+import numpy as np
+
+from app.config import (
+    FAISS_INDEX_DIR,
+    FAISS_INDEX_TYPE,
+    FAISS_RERANK_FACTOR,
+    EMBEDDING_DIMENSION,
+    HNSW_M,
+    HNSW_CONSTRUCTION_EF,
+    HNSW_SEARCH_EF
+)
+from app.vector_store import VectorStore
+
+INDEX_FILENAME = "index.faiss"
+DOCSTORE_FILENAME = "docstore.json"
+DOCLOG_FILENAME = "docstore.log"
+VECTORS_FILENAME = "vectors.f32"
+# 追加日志超过该条数且多于快照条数时合并为新快照，合并开销按写入量均摊
+COMPACT_MIN_ROWS = 10000
+
+
+class _ReadWriteLock:
+    """读写锁：检索等只读操作可并发执行，写入（添加、删除、持久化）独占；有写入等待时不再接纳新的读取"""
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+    
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+    
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class FAISSVectorStore(VectorStore):
+    """
+    FAISS 向量存储管理类
+    
+    接口与 VectorStore 保持一致，可在 main.py 中直接替换。向量归一化后使用
+    内积检索，返回的 distances 为 1 - 余弦相似度，与 ChromaDB 的 cosine 空间一致。
+    过滤条件仅支持 {"字段": 值} 形式的等值匹配。
+    
+    持久化分两部分：快照（index.faiss + docstore.json）和追加写入的新增数据
+    （docstore.log 中的文档、vectors.f32 中的 float32 原始向量）。添加文档只追加新增部分，
+    启动时把快照之后的新增向量补进索引；追加日志积累到一定规模、删除文档或关闭时再合并为新快照。
+    
+    使用 hnsw_sq8 索引时，检索先用 int8 索引取出 FAISS_RERANK_FACTOR 倍候选，
+    再用内存映射的 float32 原始向量精确重排。
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.index: Optional[faiss.Index] = None
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        # 已入库 ID 的集合，用于内容哈希去重
+        self._id_set: Set[str] = set()
+        self._lock = _ReadWriteLock()
+        # 快照中的条数，之后的数据只存在于追加日志中
+        self._snapshot_count = 0
+        # 合并快照在读锁下进行，用独立的锁避免多个合并同时执行
+        self._compact_lock = threading.Lock()
+        # 原始向量文件的内存映射，仅在文件变化时重新映射，检索时直接使用
+        self._vectors: np.ndarray = np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+    
+    def _new_index(self, quantized: bool) -> faiss.Index:
+        """创建空的 HNSW 索引（quantized 为 True 时使用 int8 标量量化）"""
+        if quantized:
+            index = faiss.IndexHNSWSQ(
+                EMBEDDING_DIMENSION,
+                faiss.ScalarQuantizer.QT_8bit,
+                HNSW_M,
+                faiss.METRIC_INNER_PRODUCT
+            )
+            # 向量已 L2 归一化，各维取值必在 [-1, 1] 内，直接按该范围训练量化器，
+            # 后续写入的向量不会被截断，也无需随数据重新训练
+            bounds = np.ones((2, EMBEDDING_DIMENSION), dtype=np.float32)
+            bounds[0] = -1.0
+            index.train(bounds)
+        else:
+            index = faiss.IndexHNSWFlat(EMBEDDING_DIMENSION, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_CONSTRUCTION_EF
+        index.hnsw.efSearch = HNSW_SEARCH_EF
+        return index
+    
+    def initialize(self):
+        """初始化嵌入模型并加载（或创建）FAISS 索引"""
+        # 初始化嵌入模型
+        self._load_embedding_model()
+        
+        FAISS_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+        index_path = FAISS_INDEX_DIR / INDEX_FILENAME
+        docstore_path = FAISS_INDEX_DIR / DOCSTORE_FILENAME
+        
+        if index_path.exists() and docstore_path.exists():
+            self.index = faiss.read_index(str(index_path))
+            self.index.hnsw.efSearch = HNSW_SEARCH_EF
+            with open(docstore_path, "r", encoding="utf-8") as f:
+                docstore = json.load(f)
+            self.ids = docstore["ids"]
+            self.documents = docstore["documents"]
+            self.metadatas = docstore["metadatas"]
+        else:
+            self.index = self._new_index(FAISS_INDEX_TYPE == "hnsw_sq8")
+            # 清理上次残留的追加数据，避免与新索引错位
+            (FAISS_INDEX_DIR / DOCLOG_FILENAME).unlink(missing_ok=True)
+            (FAISS_INDEX_DIR / VECTORS_FILENAME).unlink(missing_ok=True)
+            # 先写入空快照，之后追加的数据重启时才能在其基础上补回
+            self._write_snapshot()
+        self._snapshot_count = len(self.ids)
+        self._replay_log()
+        self._id_set = set(self.ids)
+    
+    def _replay_log(self):
+        """读取快照之后追加的文档和向量，补进内存和索引"""
+        # 早期版本没有原始向量文件（或只在量化索引时写入），先用索引中的向量补齐
+        self._vectors = self._load_vectors()
+        if len(self._vectors) < self.index.ntotal:
+            missing = self.index.reconstruct_n(len(self._vectors), self.index.ntotal - len(self._vectors))
+            with open(FAISS_INDEX_DIR / VECTORS_FILENAME, "ab") as f:
+                f.write(np.ascontiguousarray(missing, dtype=np.float32).tobytes())
+            self._vectors = self._load_vectors()
+        
+        log_path = FAISS_INDEX_DIR / DOCLOG_FILENAME
+        if log_path.exists():
+            with open(log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 写入中断留下的不完整行
+                        break
+                    # 合并快照中断时日志可能包含已写入快照的条目
+                    if entry["pos"] < len(self.ids):
+                        continue
+                    if entry["pos"] != len(self.ids):
+                        break
+                    self.ids.append(entry["id"])
+                    self.documents.append(entry["document"])
+                    self.metadatas.append(entry["metadata"])
+        
+        # 以文档和向量都完整的条数为准
+        count = min(len(self.ids), len(self._vectors))
+        del self.ids[count:], self.documents[count:], self.metadatas[count:]
+        if self.index.ntotal > count:
+            index = self._new_index(self._quantized)
+            if count:
+                index.add(np.ascontiguousarray(self._vectors[:count]))
+            self.index = index
+        elif self.index.ntotal < count:
+            self.index.add(np.ascontiguousarray(self._vectors[self.index.ntotal:count]))
+        
+        # 写入中断时向量文件可能多出没有对应文档的行，截断后才能与之后追加的数据对齐
+        if len(self._vectors) > count:
+            self._vectors = None
+            os.truncate(FAISS_INDEX_DIR / VECTORS_FILENAME, count * EMBEDDING_DIMENSION * 4)
+            self._vectors = self._load_vectors()
+    
+    def _write_snapshot(self):
+        """
+        写入快照并清空追加日志（先写临时文件再替换，避免写入中断导致损坏）
+        
+        调用方需持有读锁或写锁，保证期间没有新的追加。
+        """
+        index_path = FAISS_INDEX_DIR / INDEX_FILENAME
+        docstore_path = FAISS_INDEX_DIR / DOCSTORE_FILENAME
+        
+        faiss.write_index(self.index, f"{index_path}.tmp")
+        with open(f"{docstore_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(
+                {"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas},
+                f,
+                ensure_ascii=False
+            )
+        os.replace(f"{index_path}.tmp", index_path)
+        os.replace(f"{docstore_path}.tmp", docstore_path)
+        # 日志条目带有位置，即使清空前中断，重新加载时也会跳过已在快照中的条目
+        open(FAISS_INDEX_DIR / DOCLOG_FILENAME, "w").close()
+        self._snapshot_count = len(self.ids)
+    
+    def _compact(self):
+        """追加日志合并为新快照；只持有读锁，检索不受影响，写入等待合并完成"""
+        with self._compact_lock:
+            with self._lock.read():
+                if len(self.ids) > self._snapshot_count:
+                    self._write_snapshot()
+    
+    @staticmethod
+    def _to_vectors(embeddings: np.ndarray) -> np.ndarray:
+        """转换为 L2 归一化的 float32 矩阵，使内积等于余弦相似度"""
+        vectors = np.array(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIMENSION)
+        faiss.normalize_L2(vectors)
+        return vectors
+    
+    @property
+    def _quantized(self) -> bool:
+        """已加载的索引是否为 int8 量化索引（以实际索引类型为准，不受配置变化影响）"""
+        return isinstance(self.index, faiss.IndexHNSWSQ)
+    
+    @property
+    def _rerank_enabled(self) -> bool:
+        """是否使用 float32 向量重排（仅量化索引，且向量文件与索引条数一致）"""
+        return self._quantized and len(self._vectors) == self.index.ntotal
+    
+    def _load_vectors(self) -> np.ndarray:
+        """以只读内存映射方式加载 float32 原始向量（与索引中的向量按位置一一对应）"""
+        vectors_path = FAISS_INDEX_DIR / VECTORS_FILENAME
+        if not vectors_path.exists() or vectors_path.stat().st_size == 0:
+            return np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+        return np.memmap(vectors_path, dtype=np.float32, mode="r").reshape(-1, EMBEDDING_DIMENSION)
+    
+    @staticmethod
+    def _matches(metadata: Dict[str, Any], filter_dict: Dict[str, Any]) -> bool:
+        """判断元数据是否满足等值过滤条件"""
+        return all(metadata.get(key) == value for key, value in filter_dict.items())
+    
+    def add_documents(
+        self,
+        documents: List[str],
+        metadata: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None,
+        embeddings: Optional[np.ndarray] = None
+    ) -> List[str]:
+        """
+        添加文档到向量存储
+        
+        Args:
+            documents: 文档文本列表
+            metadata: 元数据列表
+            ids: 文档 ID 列表（可选，未提供时以内容哈希作为 ID，已入库的相同内容会被跳过）
+            embeddings: 预先计算的向量矩阵（可选，未提供时自动生成）
+            
+        Returns:
+            文档 ID 列表
+        """
+        if self.index is None:
+            raise RuntimeError("索引未初始化，请先调用 initialize()")
+        
+        if not documents:
+            return []
+        
+        # 生成 ID，相同内容重复入库时跳过，不再重复编码和写入
+        new_ids = ids
+        dedupe = ids is None
+        if dedupe:
+            ids = self._content_ids(documents)
+            with self._lock.read():
+                keep = self._new_positions(ids, self._id_set)
+            if not keep:
+                return ids
+            new_ids = [ids[i] for i in keep]
+            documents = [documents[i] for i in keep]
+            metadata = [metadata[i] for i in keep]
+            if embeddings is not None:
+                embeddings = np.asarray(embeddings)[keep]
+        
+        # 生成向量
+        if embeddings is None:
+            embeddings = self._generate_embeddings(documents)
+        vectors = self._to_vectors(embeddings)
+        
+        with self._lock.write():
+            if dedupe:
+                # 编码期间其他请求可能已写入相同内容，持有写锁后再过滤一次
+                keep = self._new_positions(new_ids, self._id_set)
+                if not keep:
+                    return ids
+                if len(keep) < len(new_ids):
+                    new_ids = [new_ids[i] for i in keep]
+                    documents = [documents[i] for i in keep]
+                    metadata = [metadata[i] for i in keep]
+                    vectors = vectors[keep]
+            # 只追加新增的向量和文档，不重写已有数据
+            with open(FAISS_INDEX_DIR / VECTORS_FILENAME, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(FAISS_INDEX_DIR / DOCLOG_FILENAME, "a", encoding="utf-8") as f:
+                f.writelines(
+                    json.dumps(
+                        {"pos": pos, "id": doc_id, "document": document, "metadata": meta},
+                        ensure_ascii=False
+                    ) + "\n"
+                    for pos, doc_id, document, meta in zip(
+                        range(len(self.ids), len(self.ids) + len(new_ids)), new_ids, documents, metadata
+                    )
+                )
+            self._vectors = self._load_vectors()
+            self.index.add(vectors)
+            self.ids.extend(new_ids)
+            self._id_set.update(new_ids)
+            self.documents.extend(documents)
+            self.metadatas.extend(metadata)
+        
+        if len(self.ids) - self._snapshot_count > max(COMPACT_MIN_ROWS, self._snapshot_count):
+            self._compact()
+        
+        return ids
+    
+    def search_many(
+        self,
+        queries: List[str],
+        n_results: int = 3,
+        filter_dict: Optional[Dict[str, Any]] = None,
+        query_embeddings: Optional[np.ndarray] = None
+    ) -> Dict[str, Any]:
+        """
+        批量向量检索（一次编码全部查询，一次调用完成检索）
+        
+        Args:
+            queries: 查询文本列表
+            n_results: 每个查询的返回结果数量
+            filter_dict: 过滤条件
+            query_embeddings: 预先计算的查询向量矩阵（可选，未提供时自动生成）
+            
+        Returns:
+            检索结果字典，各字段的第 i 项对应第 i 个查询
+        """
+        if self.index is None:
+            raise RuntimeError("索引未初始化，请先调用 initialize()")
+        
+        # 生成查询向量
+        if query_embeddings is None:
+            query_embeddings = self._generate_embeddings(queries)
+        query_vectors = self._to_vectors(query_embeddings)
+        
+        # 只读锁：并发检索互不阻塞，仅与写入互斥（HNSW 不支持边写边查）
+        with self._lock.read():
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = max(HNSW_SEARCH_EF, n_results)
+            if filter_dict:
+                positions = np.array(
+                    [i for i, meta in enumerate(self.metadatas) if self._matches(meta, filter_dict)],
+                    dtype=np.int64
+                )
+                params.sel = faiss.IDSelectorBatch(positions)
+            
+            k = min(n_results, self.index.ntotal)
+            if k == 0:
+                return {
+                    key: [[] for _ in range(len(query_vectors))]
+                    for key in ("ids", "documents", "metadatas", "distances")
+                }
+            
+            if self._rerank_enabled:
+                # 量化索引粗排取更多候选，再用原始向量精确计算相似度
+                fetch = min(k * FAISS_RERANK_FACTOR, self.index.ntotal)
+                params.efSearch = max(params.efSearch, fetch)
+                _, labels = self.index.search(query_vectors, fetch, params=params)
+                all_hits = []
+                for query_vector, row in zip(query_vectors, labels):
+                    candidates = row[row >= 0]
+                    exact_scores = self._vectors[candidates] @ query_vector
+                    top = np.argsort(-exact_scores)[:k]
+                    all_hits.append([(int(candidates[i]), float(exact_scores[i])) for i in top])
+            else:
+                scores, labels = self.index.search(query_vectors, k, params=params)
+                all_hits = [
+                    [(int(label), float(score)) for label, score in zip(label_row, score_row) if label >= 0]
+                    for label_row, score_row in zip(labels, scores)
+                ]
+            
+            return {
+                "ids": [[self.ids[pos] for pos, _ in hits] for hits in all_hits],
+                "documents": [[self.documents[pos] for pos, _ in hits] for hits in all_hits],
+                "metadatas": [[self.metadatas[pos] for pos, _ in hits] for hits in all_hits],
+                "distances": [[1.0 - score for _, score in hits] for hits in all_hits]
+            }
+    
+    def _remove_positions(self, positions: List[int]):
+        """按位置删除向量，HNSW 不支持原地删除，因此用剩余向量重建索引"""
+        removed = set(positions)
+        keep = [i for i in range(len(self.ids)) if i not in removed]
+        
+        # 用原始向量重建（量化索引无需反量化），并同步重写向量文件
+        index = self._new_index(self._quantized)
+        vectors = np.ascontiguousarray(self._vectors[keep])
+        vectors_path = FAISS_INDEX_DIR / VECTORS_FILENAME
+        with open(f"{vectors_path}.tmp", "wb") as f:
+            f.write(vectors.tobytes())
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        self._vectors = self._load_vectors()
+        if keep:
+            index.add(vectors)
+        
+        self.index = index
+        self.ids = [self.ids[i] for i in keep]
+        self._id_set = set(self.ids)
+        self.documents = [self.documents[i] for i in keep]
+        self.metadatas = [self.metadatas[i] for i in keep]
+        self._write_snapshot()
+    
+    def delete_document(self, document_id: str) -> bool:
+        """
+        删除文档
+        
+        Args:
+            document_id: 文档 ID
+            
+        Returns:
+            是否删除成功
+        """
+        if self.index is None:
+            raise RuntimeError("索引未初始化，请先调用 initialize()")
+        
+        try:
+            with self._lock.write():
+                positions = [i for i, chunk_id in enumerate(self.ids) if chunk_id == document_id]
+                if positions:
+                    self._remove_positions(positions)
+            return True
+        except Exception:
+            return False
+    
+    def delete_documents_by_filter(self, filter_dict: Dict[str, Any]) -> bool:
+        """
+        根据过滤条件删除文档
+        
+        Args:
+            filter_dict: 过滤条件
+            
+        Returns:
+            是否删除成功
+        """
+        if self.index is None:
+            raise RuntimeError("索引未初始化，请先调用 initialize()")
+        
+        try:
+            with self._lock.write():
+                positions = [
+                    i for i, meta in enumerate(self.metadatas) if self._matches(meta, filter_dict)
+                ]
+                if positions:
+                    self._remove_positions(positions)
+            return True
+        except Exception:
+            return False
+    
+    def list_documents(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        列出所有文档
+        
+        Args:
+            limit: 返回数量限制
+            
+        Returns:
+            文档信息列表
+        """
+        if self.index is None:
+            raise RuntimeError("索引未初始化，请先调用 initialize()")
+        
+        with self._lock.read():
+            return [
+                {"id": chunk_id, "document": document, "metadata": meta}
+                for chunk_id, document, meta in zip(
+                    self.ids[:limit], self.documents[:limit], self.metadatas[:limit]
+                )
+            ]
+    
+    def _first_chunk_metadatas(self) -> List[Dict[str, Any]]:
+        """获取每个文档首个分块（chunk_index 为 0）的元数据"""
+        if self.index is None:
+            raise RuntimeError("索引未初始化，请先调用 initialize()")
+        
+        with self._lock.read():
+            return [meta for meta in self.metadatas if meta.get("chunk_index") == 0]
+    
+    def _count_chunks(self, document_id: str) -> int:
+        """统计文档的分块数量"""
+        with self._lock.read():
+            return sum(1 for meta in self.metadatas if meta.get("document_id") == document_id)
+    
+    def get_collection_count(self) -> int:
+        """获取索引中的文档数量"""
+        if self.index is None:
+            return 0
+        return self.index.ntotal
+    
+    def close(self):
+        """合并追加日志并释放后台资源"""
+        if self.index is not None:
+            self._compact()
+        super().close()
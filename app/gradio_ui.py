@@ -8,6 +8,9 @@ from datetime import datetime
 # 后端 API 地址
 API_BASE_URL = "http://localhost:8000"
 
+# 复用到后端的 HTTP 连接
+session = requests.Session()
+
 
 def upload_file(file, chunk_mode: str) -> str:
     """
@@ -28,7 +31,7 @@ def upload_file(file, chunk_mode: str) -> str:
             files = {"file": (file.name, f, "application/octet-stream")}
             data = {"chunk_mode": chunk_mode}
             
-            response = requests.post(
+            response = session.post(
                 f"{API_BASE_URL}/api/upload",
                 files=files,
                 data=data,
@@ -67,7 +70,7 @@ def query_document(question: str, top_k: int) -> Tuple[str, str]:
         return "❌ 请输入问题", ""
     
     try:
-        response = requests.post(
+        response = session.post(
             f"{API_BASE_URL}/api/query",
             json={
                 "question": question,
@@ -118,10 +121,10 @@ def get_documents(page: int = 1, page_size: int = 10) -> Tuple[str, List[Tuple[s
         (文档列表HTML, 文档选择列表) 元组
     """
     try:
-        # 获取所有文档（后端暂时只支持 limit，我们做客户端分页）
-        response = requests.get(
+        # 由后端按文档聚合并分页
+        response = session.get(
             f"{API_BASE_URL}/api/documents",
-            params={"limit": 1000},  # 获取足够多的文档
+            params={"page": page, "page_size": page_size},
             timeout=30
         )
         response.raise_for_status()
@@ -130,46 +133,10 @@ def get_documents(page: int = 1, page_size: int = 10) -> Tuple[str, List[Tuple[s
         if not result.get("success"):
             return "❌ 获取文档列表失败", []
         
-        documents = result.get("documents", [])
-        
-        # 按文档ID分组（因为一个文档可能有多个chunk）
-        doc_dict = {}
-        for doc in documents:
-            metadata = doc.get("metadata", {})
-            doc_id = metadata.get("document_id")
-            if doc_id:
-                if doc_id not in doc_dict:
-                    doc_dict[doc_id] = {
-                        "filename": metadata.get("filename", "未知"),
-                        "file_type": metadata.get("file_type", "未知"),
-                        "upload_time": metadata.get("upload_time", ""),
-                        "chunks": []
-                    }
-                doc_dict[doc_id]["chunks"].append(doc)
-        
-        # 转换为列表并排序
-        doc_list = [
-            {
-                "document_id": doc_id,
-                "filename": info["filename"],
-                "file_type": info["file_type"],
-                "upload_time": info["upload_time"],
-                "chunks_count": len(info["chunks"])
-            }
-            for doc_id, info in doc_dict.items()
-        ]
-        
-        # 按上传时间倒序排序
-        doc_list.sort(key=lambda x: x["upload_time"], reverse=True)
-        
-        total = len(doc_list)
+        page_docs = result.get("documents", [])
+        total = result.get("total", 0)
         total_pages = (total + page_size - 1) // page_size
         
-        # 分页
-        start_idx = (page - 1) * page_size
-        end_idx = start_idx + page_size
-        page_docs = doc_list[start_idx:end_idx]
-        
         # 生成HTML表格
         html = f"""
         <div style="margin-bottom: 10px;">
@@ -230,7 +197,7 @@ def delete_document(document_id: str) -> str:
         return "❌ 请选择要删除的文档"
     
     try:
-        response = requests.delete(
+        response = session.delete(
             f"{API_BASE_URL}/api/documents/{document_id}",
             timeout=30
         )
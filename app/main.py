@@ -1,15 +1,16 @@
 """FastAPI 应用主入口"""
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
-from typing import Literal
+from typing import List, Literal, Optional
 
-from app.config import COLLECTION_NAME
+from app.config import COLLECTION_NAME, VECTOR_STORE_BACKEND
 from app.vector_store import VectorStore
 from app.rag_service import RAGService
-from app.api.upload import upload_document_with_store
-from app.api.query import query_document_with_service
-from app.models import UploadResponse, QueryRequest, QueryResponse
+from app.api.upload import upload_document_with_store, upload_documents_with_store
+from app.api.query import query_document_with_service, stream_document_with_service
+from app.models import UploadResponse, BatchUploadResponse, QueryRequest, QueryResponse
 
 # 全局服务实例
 vector_store: VectorStore = None
@@ -22,8 +23,13 @@ async def lifespan(app: FastAPI):
     global vector_store, rag_service
     
     # 启动时初始化
-    print("正在初始化向量存储...")
-    vector_store = VectorStore()
+    print(f"正在初始化向量存储（{VECTOR_STORE_BACKEND}）...")
+    if VECTOR_STORE_BACKEND == "faiss":
+        # 按需导入，未使用 FAISS 后端时无需安装 faiss
+        from app.faiss_vector_store import FAISSVectorStore
+        vector_store = FAISSVectorStore()
+    else:
+        vector_store = VectorStore()
     vector_store.initialize()
     print(f"向量存储初始化完成，集合: {COLLECTION_NAME}")
     print(f"当前文档数量: {vector_store.get_collection_count()}")
@@ -35,7 +41,8 @@ async def lifespan(app: FastAPI):
     
     yield
     
-    # 关闭时清理（如果需要）
+    # 关闭时清理
+    vector_store.close()
 
 
 # 创建 FastAPI 应用
@@ -43,6 +50,7 @@ app = FastAPI(
     title="个人知识库后端",
     description="基于 FastAPI + ChromaDB + Ollama 的 RAG 知识库系统",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -107,6 +115,27 @@ async def upload_document(
     return await upload_document_with_store(file, chunk_mode, vector_store)
 
 
+@app.post("/api/upload/batch", response_model=BatchUploadResponse)
+async def upload_documents(
+    files: List[UploadFile] = File(...),
+    chunk_mode: Literal["chunked", "full"] = Form(default="chunked")
+):
+    """
+    批量上传文档接口
+    
+    - **files**: 上传的文件列表（PDF 或 TXT）
+    - **chunk_mode**: 文档处理模式（同 `/api/upload`）
+    
+    多个文件并发处理，单个文件失败会记录在 `errors` 中，不影响其他文件。
+    """
+    global vector_store
+    
+    if vector_store is None:
+        raise HTTPException(status_code=503, detail="向量存储服务未初始化")
+    
+    return await upload_documents_with_store(files, chunk_mode, vector_store)
+
+
 @app.post("/api/query", response_model=QueryResponse)
 async def query_document(request: QueryRequest):
     """
@@ -124,12 +153,37 @@ async def query_document(request: QueryRequest):
     return await query_document_with_service(request, rag_service)
 
 
+@app.post("/api/query/stream")
+async def query_document_stream(request: QueryRequest):
+    """
+    流式文档问答接口（Server-Sent Events）
+    
+    - **question**: 用户问题
+    - **top_k**: 检索的文档块数量（默认 3）
+    
+    先推送 `chunks` 事件（相关文档块），随后逐段推送 `token` 事件，
+    最后以 `done`（或 `error`）事件结束。
+    """
+    global rag_service
+    
+    if rag_service is None:
+        raise HTTPException(status_code=503, detail="RAG 服务未初始化")
+    
+    return await stream_document_with_service(request, rag_service)
+
+
 @app.get("/api/documents")
-async def list_documents(limit: int = 100):
+async def list_documents(
+    limit: int = 100,
+    page: Optional[int] = Query(default=None, ge=1),
+    page_size: int = Query(default=10, ge=1, le=100)
+):
     """
     列出所有文档
     
-    - **limit**: 返回数量限制（默认 100）
+    - **limit**: 返回数量限制（默认 100），按分块返回
+    - **page**: 页码（从 1 开始）。提供时按文档聚合分页返回，忽略 `limit`
+    - **page_size**: 每页文档数量（默认 10）
     """
     global vector_store
     
@@ -137,6 +191,17 @@ async def list_documents(limit: int = 100):
         raise HTTPException(status_code=503, detail="向量存储服务未初始化")
     
     try:
+        if page is not None:
+            total, documents = vector_store.list_document_summaries(page, page_size)
+            return {
+                "success": True,
+                "total": total,
+                "page": page,
+                "page_size": page_size,
+                "count": len(documents),
+                "documents": documents
+            }
+        
         documents = vector_store.list_documents(limit=limit)
         return {
             "success": True,
@@ -14,6 +14,19 @@ class UploadResponse(BaseModel):
     message: str
 
 
+class BatchUploadError(BaseModel):
+    """批量上传中单个文件的失败信息"""
+    filename: str
+    detail: str
+
+
+class BatchUploadResponse(BaseModel):
+    """批量上传响应"""
+    success: bool
+    results: List[UploadResponse]
+    errors: List[BatchUploadError]
+
+
 class QueryRequest(BaseModel):
     """查询请求"""
     question: str = Field(..., description="用户问题", min_length=1)
@@ -1,10 +1,16 @@
 """RAG 问答服务模块"""
+import functools
+import numpy as np
+import orjson
 import requests
-from typing import List, Dict, Any
-from app.config import OLLAMA_BASE_URL, OLLAMA_MODEL, TOP_K
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, Iterator
+from app.config import OLLAMA_BASE_URL, OLLAMA_MODEL, TOP_K, QUERY_EMBEDDING_CACHE_SIZE
 from app.vector_store import VectorStore
 from app.models import DocumentChunk
 
+NO_RESULT_ANSWER = "抱歉，未找到相关文档内容。"
+
 
 class RAGService:
     """RAG 问答服务类"""
@@ -13,6 +19,23 @@ class RAGService:
         self.vector_store = vector_store
         self.ollama_url = f"{OLLAMA_BASE_URL}/api/generate"
         self.model = OLLAMA_MODEL
+        
+        # 复用 HTTP 连接（keep-alive），避免每次调用重新建立 TCP 连接
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        
+        # 缓存最近问题的查询向量，重复提问时跳过向量化
+        self._embed_cached = functools.lru_cache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)(
+            self._embed_question
+        )
+    
+    def _embed_question(self, question: str) -> np.ndarray:
+        """生成问题的查询向量（设为只读，避免缓存值被修改）"""
+        embedding = self.vector_store.embed_query(question)
+        embedding.flags.writeable = False
+        return embedding
     
     def _build_prompt(self, question: str, context_chunks: List[Dict[str, Any]]) -> str:
         """
@@ -25,10 +48,10 @@ class RAGService:
         Returns:
             构建的 prompt
         """
-        context_text = "\n\n".join([
-            f"[文档片段 {i+1}]\n{chunk['document']}"
-            for i, chunk in enumerate(context_chunks)
-        ])
+        context_text = "\n\n".join(
+            f"[文档片段 {i}]\n{chunk['document']}"
+            for i, chunk in enumerate(context_chunks, 1)
+        )
         
         prompt = f"""基于以下文档内容回答问题。如果文档中没有相关信息，请说明无法从文档中找到答案。
 
@@ -52,7 +75,7 @@ class RAGService:
             生成的回答
         """
         try:
-            response = requests.post(
+            response = self.session.post(
                 self.ollama_url,
                 json={
                     "model": self.model,
@@ -62,32 +85,69 @@ class RAGService:
                 timeout=60
             )
             response.raise_for_status()
-            result = response.json()
+            result = orjson.loads(response.content)
             return result.get("response", "抱歉，无法生成回答。")
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
             raise RuntimeError(f"Ollama API 调用失败: {str(e)}")
     
-    def query(
+    def _stream_ollama(self, prompt: str) -> Iterator[str]:
+        """
+        以流式方式调用 Ollama API，逐段返回生成的回答
+        
+        Args:
+            prompt: 输入 prompt
+            
+        Yields:
+            回答片段
+        """
+        try:
+            with self.session.post(
+                self.ollama_url,
+                json={
+                    "model": self.model,
+                    "prompt": prompt,
+                    "stream": True
+                },
+                stream=True,
+                timeout=60
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    result = orjson.loads(line)
+                    if "error" in result:
+                        raise RuntimeError(f"Ollama API 调用失败: {result['error']}")
+                    if result.get("response"):
+                        yield result["response"]
+                    if result.get("done"):
+                        break
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+            raise RuntimeError(f"Ollama API 调用失败: {str(e)}")
+    
+    def _retrieve(
         self,
         question: str,
-        top_k: int = TOP_K
-    ) -> tuple[str, List[DocumentChunk]]:
+        top_k: int
+    ) -> tuple[List[Dict[str, Any]], List[DocumentChunk]]:
         """
-        执行 RAG 查询
+        检索与问题相关的文档块
         
         Args:
             question: 用户问题
             top_k: 检索的文档块数量
             
         Returns:
-            (答案, 相关文档块列表) 元组
+            (prompt 上下文块列表, 相关文档块列表) 元组，无结果时均为空列表
         """
-        # 1. 向量检索
-        search_results = self.vector_store.search(query=question, n_results=top_k)
+        search_results = self.vector_store.search(
+            query=question,
+            n_results=top_k,
+            query_embedding=self._embed_cached(question)
+        )
         
-        # 2. 处理检索结果
         if not search_results.get("documents") or not search_results["documents"][0]:
-            return "抱歉，未找到相关文档内容。", []
+            return [], []
         
         # 构建文档块列表
         context_chunks = []
@@ -98,28 +158,68 @@ class RAGService:
         distances = search_results.get("distances", [[]])[0]
         ids = search_results.get("ids", [[]])[0]
         
-        for i in range(len(documents)):
-            chunk_data = {
-                "document": documents[i],
-                "metadata": metadatas[i] if i < len(metadatas) else {},
-                "distance": distances[i] if i < len(distances) else None,
-                "id": ids[i] if i < len(ids) else ""
-            }
-            context_chunks.append(chunk_data)
+        for document, metadata, distance, chunk_id in zip(documents, metadatas, distances, ids):
+            # prompt 只用到文档内容
+            context_chunks.append({"document": document})
             
             # 构建 DocumentChunk 对象
             relevant_chunks.append(DocumentChunk(
-                chunk_id=chunk_data["id"],
-                content=chunk_data["document"],
-                metadata=chunk_data["metadata"],
-                score=1.0 - chunk_data["distance"] if chunk_data["distance"] is not None else None
+                chunk_id=chunk_id,
+                content=document,
+                metadata=metadata or {},
+                score=1.0 - distance if distance is not None else None
             ))
         
-        # 3. 构建 prompt
+        return context_chunks, relevant_chunks
+    
+    def query(
+        self,
+        question: str,
+        top_k: int = TOP_K
+    ) -> tuple[str, List[DocumentChunk]]:
+        """
+        执行 RAG 查询
+        
+        Args:
+            question: 用户问题
+            top_k: 检索的文档块数量
+            
+        Returns:
+            (答案, 相关文档块列表) 元组
+        """
+        # 1. 向量检索
+        context_chunks, relevant_chunks = self._retrieve(question, top_k)
+        if not context_chunks:
+            return NO_RESULT_ANSWER, []
+        
+        # 2. 构建 prompt
         prompt = self._build_prompt(question, context_chunks)
         
-        # 4. 调用 Ollama 生成回答
+        # 3. 调用 Ollama 生成回答
         answer = self._call_ollama(prompt)
         
         return answer, relevant_chunks
-
+    
+    def query_stream(
+        self,
+        question: str,
+        top_k: int = TOP_K
+    ) -> tuple[Iterator[str], List[DocumentChunk]]:
+        """
+        执行流式 RAG 查询
+        
+        检索在调用时立即完成，回答由返回的生成器在迭代时逐段产生。
+        
+        Args:
+            question: 用户问题
+            top_k: 检索的文档块数量
+            
+        Returns:
+            (回答片段生成器, 相关文档块列表) 元组
+        """
+        context_chunks, relevant_chunks = self._retrieve(question, top_k)
+        if not context_chunks:
+            return iter([NO_RESULT_ANSWER]), []
+        
+        prompt = self._build_prompt(question, context_chunks)
+        return self._stream_ollama(prompt), relevant_chunks
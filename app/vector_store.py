@@ -1,31 +1,117 @@
 """向量存储模块"""
-import uuid
+import hashlib
+import threading
 from pathlib import Path
-from typing import List, Dict, Optional, Any
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+from typing import TYPE_CHECKING, AbstractSet, List, Dict, Optional, Any, Tuple
+import numpy as np
 
+from app.embedding_batcher import EmbeddingBatcher
+from app.embedding_cache import EmbeddingCache
 from app.config import (
     CHROMA_DB_PATH,
     COLLECTION_NAME,
     EMBEDDING_MODEL,
-    EMBEDDING_DIMENSION
+    EMBEDDING_DIMENSION,
+    EMBEDDING_BACKEND,
+    EMBEDDING_MODEL_FILE,
+    EMBEDDING_DEVICE,
+    EMBEDDING_COMPILE,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_PROCESSES,
+    EMBEDDING_NUM_THREADS,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    QUERY_BATCH_MAX,
+    QUERY_BATCH_WINDOW_MS,
+    HNSW_M,
+    HNSW_CONSTRUCTION_EF,
+    HNSW_SEARCH_EF
 )
 
+# chromadb / sentence_transformers / torch 导入耗时较长，推迟到初始化时再加载
+if TYPE_CHECKING:
+    import chromadb
+    from sentence_transformers import SentenceTransformer
+
 
 class VectorStore:
     """ChromaDB 向量存储管理类"""
     
     def __init__(self):
-        self.client: Optional[chromadb.Client] = None
-        self.collection: Optional[chromadb.Collection] = None
-        self.embedding_model: Optional[SentenceTransformer] = None
+        self.client: Optional["chromadb.ClientAPI"] = None
+        self.collection: Optional["chromadb.Collection"] = None
+        self.embedding_model: Optional["SentenceTransformer"] = None
+        self.query_batcher: Optional[EmbeddingBatcher] = None
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        self.encode_pool: Optional[Dict[str, Any]] = None
+        # 快速分词器和模型都不支持多线程同时调用（查询批处理线程与入库线程会并发编码），
+        # 多进程池也共用输入输出队列，所有分词和 encode 调用都在该锁内进行
+        self._encode_lock = threading.Lock()
+    
+    def _load_embedding_model(self):
+        """加载嵌入模型"""
+        import torch
+        from sentence_transformers import SentenceTransformer
+        
+        # 限制推理线程数，避免并发请求时线程相互争抢 CPU
+        if EMBEDDING_NUM_THREADS > 0:
+            torch.set_num_threads(EMBEDDING_NUM_THREADS)
+        
+        # 初始化嵌入模型（进程内唯一实例，检索和入库共用）
+        # onnx / openvino 后端在本地没有导出文件时会自动导出
+        model_kwargs = None
+        if EMBEDDING_BACKEND != "torch" and EMBEDDING_MODEL_FILE:
+            model_kwargs = {"file_name": EMBEDDING_MODEL_FILE}
+        device = EMBEDDING_DEVICE or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.embedding_model = SentenceTransformer(
+            EMBEDDING_MODEL,
+            device=device,
+            backend=EMBEDDING_BACKEND,
+            model_kwargs=model_kwargs
+        )
+        
+        # GPU 上以 fp16 推理，显存带宽减半，向量质量几乎不受影响
+        precision = "fp32"
+        if EMBEDDING_BACKEND == "torch" and device.startswith("cuda"):
+            self.embedding_model.half()
+            precision = "fp16"
+        
+        # 编译前向计算以减少逐算子的 Python 调度开销；分块长度不一，按动态形状编译避免反复重编译
+        if EMBEDDING_COMPILE and EMBEDDING_BACKEND == "torch":
+            # encode() 直接调用 forward()，编译外层模型不生效，需编译内部的 transformers 模型
+            self.embedding_model[0].auto_model.compile(dynamic=True)
+            # 预热一次，编译耗时不计入首个请求
+            self.embedding_model.encode(["warm up"], show_progress_bar=False)
+        
+        # CPU 上为批量入库启动多进程编码池，各进程分担不同分片
+        if EMBEDDING_PROCESSES > 1 and EMBEDDING_BACKEND == "torch" and device == "cpu":
+            self.encode_pool = self.embedding_model.start_multi_process_pool(
+                target_devices=["cpu"] * EMBEDDING_PROCESSES
+            )
+        
+        # 缓存按模型、导出文件及推理精度区分，避免不同模型的向量混用
+        if EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(
+                EMBEDDING_CACHE_PATH,
+                model_name=f"{EMBEDDING_MODEL}:{EMBEDDING_BACKEND}:{EMBEDDING_MODEL_FILE}:{precision}",
+                max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+            )
+        
+        # 并发查询合并为一批编码，避免逐条以 batch=1 推理
+        self.query_batcher = EmbeddingBatcher(
+            self._generate_embeddings,
+            max_batch=QUERY_BATCH_MAX,
+            window_ms=QUERY_BATCH_WINDOW_MS
+        )
     
     def initialize(self):
         """初始化 ChromaDB 客户端和集合"""
         # 初始化嵌入模型
-        self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        self._load_embedding_model()
+        
+        import chromadb
+        from chromadb.config import Settings
         
         # 初始化 ChromaDB 客户端（持久化）
         self.client = chromadb.PersistentClient(
@@ -34,27 +120,129 @@ class VectorStore:
         )
         
         # 获取或创建集合
-        try:
-            self.collection = self.client.get_collection(name=COLLECTION_NAME)
-        except Exception:
-            # 集合不存在，创建新集合
-            self.collection = self.client.create_collection(
-                name=COLLECTION_NAME,
-                metadata={"hnsw:space": "cosine"}
-            )
+        # 向量统一由上面的模型生成，不让 ChromaDB 再加载默认的 ONNX 嵌入模型
+        # 向量已归一化，新集合使用内积度量；已有集合忽略 metadata，原 cosine 集合结果一致
+        self.collection = self.client.get_or_create_collection(
+            name=COLLECTION_NAME,
+            metadata={
+                "hnsw:space": "ip",
+                "hnsw:M": HNSW_M,
+                "hnsw:construction_ef": HNSW_CONSTRUCTION_EF,
+                "hnsw:search_ef": HNSW_SEARCH_EF
+            },
+            embedding_function=None
+        )
+        
+        # 检索 ef 可随配置调整，同步到已有集合
+        # 只发送可修改的 hnsw:search_ef，带上 hnsw:space 会被 ChromaDB 视为修改距离函数而拒绝
+        metadata = self.collection.metadata or {}
+        if metadata.get("hnsw:search_ef") != HNSW_SEARCH_EF:
+            try:
+                self.collection.modify(metadata={"hnsw:search_ef": HNSW_SEARCH_EF})
+            except Exception as e:
+                print(f"警告: 同步 hnsw:search_ef 失败，沿用集合原有配置: {e}")
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """
+        按 token 长度分桶编码
+        
+        encode 内部按字符数排序分批，但中英文混排时字符数与 token 数相差很大，
+        同一批内仍会被最长样本大量填充。这里先按实际 token 数排序，再逐批调用 encode，
+        使每批样本长度相近，最后按原顺序还原结果。
+        启用多进程编码池时，排序后的文本整体交给进程池按顺序分片编码。
+        """
+        with self._encode_lock:
+            if len(texts) <= EMBEDDING_BATCH_SIZE:
+                return self.embedding_model.encode(
+                    texts,
+                    batch_size=EMBEDDING_BATCH_SIZE,
+                    show_progress_bar=False,
+                    convert_to_numpy=True
+                )
+            
+            token_ids = self.embedding_model.tokenizer(
+                texts,
+                add_special_tokens=False,
+                truncation=True,
+                max_length=self.embedding_model.max_seq_length
+            )["input_ids"]
+            order = np.argsort([len(ids) for ids in token_ids], kind="stable")
+            sorted_texts = [texts[i] for i in order]
+            
+            if self.encode_pool:
+                sorted_embeddings = self.embedding_model.encode(
+                    sorted_texts,
+                    pool=self.encode_pool,
+                    batch_size=EMBEDDING_BATCH_SIZE,
+                    show_progress_bar=False,
+                    convert_to_numpy=True
+                )
+            else:
+                sorted_embeddings = np.concatenate([
+                    self.embedding_model.encode(
+                        sorted_texts[start:start + EMBEDDING_BATCH_SIZE],
+                        batch_size=EMBEDDING_BATCH_SIZE,
+                        show_progress_bar=False,
+                        convert_to_numpy=True
+                    )
+                    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+                ])
+            
+            embeddings = np.empty_like(sorted_embeddings)
+            embeddings[order] = sorted_embeddings
+            return embeddings
     
-    def _generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """生成文本向量"""
+    def _generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """生成文本向量（优先读取缓存，只对未命中的文本运行模型）"""
         if not self.embedding_model:
             raise RuntimeError("嵌入模型未初始化")
-        embeddings = self.embedding_model.encode(texts, show_progress_bar=False)
-        return embeddings.tolist()
+        
+        if not self.embedding_cache:
+            embeddings = self._encode(texts)
+        else:
+            cached = self.embedding_cache.get_many(texts)
+            misses = list(dict.fromkeys(text for text, emb in zip(texts, cached) if emb is None))
+            if misses:
+                encoded = self._encode(misses)
+                self.embedding_cache.put_many(misses, encoded)
+                fresh = dict(zip(misses, encoded))
+                cached = [fresh[text] if emb is None else emb for text, emb in zip(texts, cached)]
+            embeddings = np.stack(cached)
+        
+        # GPU 上 fp16 推理输出为 float16，向量库只接受 float32
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        # 统一 L2 归一化，检索时内积即余弦相似度，HNSW 无需逐次计算模长
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """生成单条查询文本的向量"""
+        if self.query_batcher:
+            return self.query_batcher.embed(query)
+        return self._generate_embeddings([query])[0]
+    
+    @staticmethod
+    def _content_ids(documents: List[str]) -> List[str]:
+        """以内容的 SHA-256 作为 ID，相同内容得到相同 ID"""
+        return [hashlib.sha256(document.encode("utf-8")).hexdigest() for document in documents]
+    
+    @staticmethod
+    def _new_positions(ids: List[str], existing: AbstractSet[str]) -> List[int]:
+        """返回尚未入库的 ID 所在位置（批内重复的 ID 只保留首个）"""
+        seen = set()
+        positions = []
+        for i, doc_id in enumerate(ids):
+            if doc_id not in existing and doc_id not in seen:
+                seen.add(doc_id)
+                positions.append(i)
+        return positions
     
     def add_documents(
         self,
         documents: List[str],
         metadata: List[Dict[str, Any]],
-        ids: Optional[List[str]] = None
+        ids: Optional[List[str]] = None,
+        embeddings: Optional[np.ndarray] = None
     ) -> List[str]:
         """
         添加文档到向量存储
@@ -62,7 +250,8 @@ class VectorStore:
         Args:
             documents: 文档文本列表
             metadata: 元数据列表
-            ids: 文档 ID 列表（可选，自动生成）
+            ids: 文档 ID 列表（可选，未提供时以内容哈希作为 ID，已入库的相同内容会被跳过）
+            embeddings: 预先计算的向量矩阵（可选，未提供时自动生成）
             
         Returns:
             文档 ID 列表
@@ -73,19 +262,31 @@ class VectorStore:
         if not documents:
             return []
         
-        # 生成向量
-        embeddings = self._generate_embeddings(documents)
-        
-        # 生成 ID
+        # 生成 ID，相同内容重复入库时跳过，不再重复编码和写入
+        new_ids = ids
         if ids is None:
-            ids = [str(uuid.uuid4()) for _ in documents]
+            ids = self._content_ids(documents)
+            # 批内可能有重复内容，ChromaDB 的 get 不接受重复 ID，查询前先去重
+            existing = set(self.collection.get(ids=list(dict.fromkeys(ids)), include=[])["ids"])
+            keep = self._new_positions(ids, existing)
+            if not keep:
+                return ids
+            new_ids = [ids[i] for i in keep]
+            documents = [documents[i] for i in keep]
+            metadata = [metadata[i] for i in keep]
+            if embeddings is not None:
+                embeddings = np.asarray(embeddings)[keep]
         
-        # 添加到集合
-        self.collection.add(
+        # 生成向量
+        if embeddings is None:
+            embeddings = self._generate_embeddings(documents)
+        
+        # 写入集合（已存在的 ID 覆盖更新）
+        self.collection.upsert(
             embeddings=embeddings,
             documents=documents,
             metadatas=metadata,
-            ids=ids
+            ids=new_ids
         )
         
         return ids
@@ -94,7 +295,8 @@ class VectorStore:
         self,
         query: str,
         n_results: int = 3,
-        filter_dict: Optional[Dict[str, Any]] = None
+        filter_dict: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[np.ndarray] = None
     ) -> Dict[str, Any]:
         """
         向量检索
@@ -103,19 +305,46 @@ class VectorStore:
             query: 查询文本
             n_results: 返回结果数量
             filter_dict: 过滤条件
+            query_embedding: 预先计算的查询向量（可选，未提供时自动生成）
             
         Returns:
             检索结果字典，包含 documents, metadatas, distances, ids
         """
+        # 生成查询向量（经微批处理器，与并发查询合并编码）
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        
+        return self.search_many([query], n_results, filter_dict, query_embeddings=query_embedding)
+    
+    def search_many(
+        self,
+        queries: List[str],
+        n_results: int = 3,
+        filter_dict: Optional[Dict[str, Any]] = None,
+        query_embeddings: Optional[np.ndarray] = None
+    ) -> Dict[str, Any]:
+        """
+        批量向量检索（一次编码全部查询，一次调用完成检索）
+        
+        Args:
+            queries: 查询文本列表
+            n_results: 每个查询的返回结果数量
+            filter_dict: 过滤条件
+            query_embeddings: 预先计算的查询向量矩阵（可选，未提供时自动生成）
+            
+        Returns:
+            检索结果字典，各字段的第 i 项对应第 i 个查询
+        """
         if not self.collection:
             raise RuntimeError("集合未初始化，请先调用 initialize()")
         
         # 生成查询向量
-        query_embedding = self._generate_embeddings([query])[0]
+        if query_embeddings is None:
+            query_embeddings = self._generate_embeddings(queries)
         
         # 执行检索
         results = self.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=np.asarray(query_embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIMENSION),
             n_results=n_results,
             where=filter_dict
         )
@@ -175,17 +404,68 @@ class VectorStore:
         
         try:
             results = self.collection.get(limit=limit)
-            documents = []
-            for i in range(len(results["ids"])):
-                documents.append({
-                    "id": results["ids"][i],
-                    "document": results["documents"][i],
-                    "metadata": results["metadatas"][i]
-                })
-            return documents
+            return [
+                {"id": chunk_id, "document": document, "metadata": meta}
+                for chunk_id, document, meta in zip(
+                    results["ids"], results["documents"], results["metadatas"]
+                )
+            ]
         except Exception as e:
             return []
     
+    def _first_chunk_metadatas(self) -> List[Dict[str, Any]]:
+        """获取每个文档首个分块（chunk_index 为 0）的元数据"""
+        if not self.collection:
+            raise RuntimeError("集合未初始化，请先调用 initialize()")
+        
+        results = self.collection.get(where={"chunk_index": 0}, include=["metadatas"])
+        return results["metadatas"]
+    
+    def _count_chunks(self, document_id: str) -> int:
+        """统计文档的分块数量"""
+        results = self.collection.get(where={"document_id": document_id}, include=[])
+        return len(results["ids"])
+    
+    def list_document_summaries(
+        self,
+        page: int = 1,
+        page_size: int = 10
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        分页列出文档（按文档聚合，按上传时间倒序）
+        
+        只读取每个文档首个分块的元数据，不拉取分块内容。
+        
+        Args:
+            page: 页码（从1开始）
+            page_size: 每页数量
+            
+        Returns:
+            (文档总数, 当前页文档信息列表) 元组
+        """
+        first_chunks = sorted(
+            self._first_chunk_metadatas(),
+            key=lambda meta: meta.get("upload_time", ""),
+            reverse=True
+        )
+        start = (page - 1) * page_size
+        
+        summaries = []
+        for meta in first_chunks[start:start + page_size]:
+            chunks_count = meta.get("chunks_count")
+            if chunks_count is None:
+                # 早期上传的文档未记录分块数
+                chunks_count = self._count_chunks(meta["document_id"])
+            summaries.append({
+                "document_id": meta["document_id"],
+                "filename": meta.get("filename", "未知"),
+                "file_type": meta.get("file_type", "未知"),
+                "upload_time": meta.get("upload_time", ""),
+                "chunks_count": chunks_count
+            })
+        
+        return len(first_chunks), summaries
+    
     def get_collection_count(self) -> int:
         """获取集合中的文档数量"""
         if not self.collection:
@@ -194,4 +474,15 @@ class VectorStore:
             return self.collection.count()
         except Exception:
             return 0
-
+    
+    def close(self):
+        """释放后台资源"""
+        if self.query_batcher:
+            self.query_batcher.close()
+            self.query_batcher = None
+        if self.embedding_cache:
+            self.embedding_cache.close()
+            self.embedding_cache = None
+        if self.encode_pool:
+            self.embedding_model.stop_multi_process_pool(self.encode_pool)
+            self.encode_pool = None
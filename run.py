@@ -3,11 +3,42 @@
 一键启动后端 FastAPI 服务 和 Gradio 前端
 """
 
+import os
+import selectors
 import subprocess
 import sys
 import time
 from pathlib import Path
 
+def wait_first_exit(procs):
+    """阻塞等待任意一个子进程退出，返回 (名称, 退出码)"""
+    # Linux 上通过 pidfd 阻塞等待，空闲时不占 CPU，子进程退出立即返回
+    if hasattr(os, "pidfd_open"):
+        fds = []
+        try:
+            with selectors.DefaultSelector() as selector:
+                for name, proc in procs:
+                    fd = os.pidfd_open(proc.pid)
+                    fds.append(fd)
+                    selector.register(fd, selectors.EVENT_READ, (name, proc))
+                (key, _), *_ = selector.select()
+                name, proc = key.data
+                return name, proc.wait()
+        except OSError:
+            # 内核不支持 pidfd，退回轮询
+            pass
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    # 其他平台轮询
+    while True:
+        for name, proc in procs:
+            code = proc.poll()
+            if code is not None:
+                return name, code
+        time.sleep(1)
+
 def main():
     project_root = Path(__file__).resolve().parent
 
@@ -53,18 +84,8 @@ def main():
         print("\n✅ 后端和前端已启动，按 Ctrl+C 退出。")
 
         # 等待两个子进程（任意一个退出就结束）
-        while True:
-            backend_code = backend_proc.poll()
-            gradio_code = gradio_proc.poll()
-
-            if backend_code is not None:
-                print(f"\n⚠️ 后端进程退出，退出码: {backend_code}")
-                break
-            if gradio_code is not None:
-                print(f"\n⚠️ 前端进程退出，退出码: {gradio_code}")
-                break
-
-            time.sleep(1)
+        name, code = wait_first_exit([("后端", backend_proc), ("前端", gradio_proc)])
+        print(f"\n⚠️ {name}进程退出，退出码: {code}")
 
     except KeyboardInterrupt:
         print("\n⏹ 收到 Ctrl+C，正在关闭子进程...")
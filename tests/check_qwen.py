@@ -8,15 +8,47 @@ import subprocess
 import sys
 import json
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Tuple, Optional
 
 try:
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 except ImportError:
     print("错误: 需要安装 requests 库")
     print("请运行: pip install requests")
     sys.exit(1)
 
+# 各项 HTTP 检查共用一个会话，复用 keep-alive 连接
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(total=2, backoff_factor=0.2)
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+OLLAMA_TAGS_URL = "http://localhost:11434/api/tags"
+OLLAMA_GENERATE_URL = "http://localhost:11434/api/generate"
+GENERATE_PAYLOAD = {
+    "model": "qwen2.5:7b",
+    "prompt": "你好",
+    "stream": False,
+    "options": {"num_predict": 16}  # 只验证能否生成，限制输出长度
+}
+
+# 一次进入容器同时获取模型列表和 GPU 信息，两段输出以分隔符隔开
+SECTION_SEPARATOR = "---"
+# nvidia-smi 执行失败（驱动异常、命令不存在）时输出的标记，其错误信息可能也出现在 stdout 中
+NO_GPU_MARKER = "__NO_GPU__"
+CONTAINER_INFO_CMD = [
+    "docker", "compose", "exec", "-T", "ollama", "sh", "-c",
+    f"ollama list; echo '{SECTION_SEPARATOR}'; "
+    f"nvidia-smi --query-gpu=name --format=csv,noheader 2>/dev/null || echo '{NO_GPU_MARKER}'"
+]
+
 # 颜色定义
 class Colors:
     GREEN = '\033[0;32m'
@@ -50,11 +82,20 @@ def run_command(cmd: list, capture_output: bool = True) -> Tuple[int, str, str]:
     except Exception as e:
         return 1, "", str(e)
 
-def check_container_status() -> bool:
-    """检查容器状态"""
+def check_container_status(result: Tuple[int, str, str]) -> bool:
+    """检查容器状态（解析 docker compose ps --format json 的输出）"""
     print("1. 检查容器状态... ", end="", flush=True)
-    code, stdout, _ = run_command(["docker", "compose", "ps", "ollama"])
-    if code == 0 and "Up" in stdout and "healthy" in stdout:
+    code, stdout, _ = result
+    containers = []
+    if code == 0:
+        # 新版 compose 每行输出一个 JSON 对象，旧版输出一个 JSON 数组
+        for line in stdout.splitlines():
+            try:
+                parsed = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            containers.extend(parsed if isinstance(parsed, list) else [parsed])
+    if any(c.get("State") == "running" and c.get("Health") == "healthy" for c in containers):
         print_success("通过")
         return True
     else:
@@ -62,11 +103,11 @@ def check_container_status() -> bool:
         print_info("   容器未运行或未健康")
         return False
 
-def check_service_port() -> bool:
+def check_service_port(response_future: Future) -> bool:
     """检查服务端口是否可访问"""
     print("2. 检查服务端口 (11434)... ", end="", flush=True)
     try:
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
+        response = response_future.result()
         if response.status_code == 200:
             print_success("通过")
             return True
@@ -79,11 +120,10 @@ def check_service_port() -> bool:
         print_info(f"   无法连接到 Ollama API: {e}")
         return False
 
-def check_model_downloaded() -> Tuple[bool, Optional[str]]:
-    """检查模型是否已下载"""
+def check_model_downloaded(stdout: str) -> Tuple[bool, Optional[str]]:
+    """检查模型是否已下载（stdout 为容器内 ollama list 的输出）"""
     print("3. 检查模型是否已下载... ", end="", flush=True)
-    code, stdout, _ = run_command(["docker", "compose", "exec", "-T", "ollama", "ollama", "list"])
-    if code == 0 and "qwen2.5:7b" in stdout:
+    if "qwen2.5:7b" in stdout:
         # 尝试提取模型大小
         lines = stdout.strip().split('\n')
         for line in lines:
@@ -100,11 +140,10 @@ def check_model_downloaded() -> Tuple[bool, Optional[str]]:
         print_info("   未找到 qwen2.5:7b 模型")
         return False, None
 
-def check_gpu_support() -> bool:
-    """检查 GPU 支持"""
+def check_gpu_support(stdout: str) -> bool:
+    """检查 GPU 支持（stdout 为容器内 nvidia-smi 的输出）"""
     print("4. 检查 GPU 支持... ", end="", flush=True)
-    code, stdout, _ = run_command(["docker", "compose", "exec", "-T", "ollama", "nvidia-smi", "--query-gpu=name", "--format=csv,noheader"])
-    if code == 0 and stdout.strip():
+    if stdout.strip() and NO_GPU_MARKER not in stdout:
         gpu_name = stdout.strip().split('\n')[0]
         print_success(f"通过 (GPU: {gpu_name})")
         return True
@@ -112,20 +151,11 @@ def check_gpu_support() -> bool:
         print_warning("警告 (未检测到 GPU，将使用 CPU)")
         return True  # 仍然算通过，只是使用 CPU
 
-def test_model_response() -> bool:
+def test_model_response(response_future: Future) -> bool:
     """测试模型响应"""
     print("5. 测试模型响应... ", end="", flush=True)
     try:
-        payload = {
-            "model": "qwen2.5:7b",
-            "prompt": "你好",
-            "stream": False
-        }
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json=payload,
-            timeout=30
-        )
+        response = response_future.result()
         if response.status_code == 200:
             data = response.json()
             if "response" in data:
@@ -151,10 +181,10 @@ def test_model_response() -> bool:
         print_info(f"   请求错误: {e}")
         return False
 
-def check_data_volume() -> bool:
+def check_data_volume(result: Tuple[int, str, str]) -> bool:
     """检查数据卷"""
     print("6. 检查数据卷... ", end="", flush=True)
-    code, stdout, _ = run_command(["docker", "volume", "inspect", "second-brain_ollama_data"])
+    code, stdout, _ = result
     if code == 0:
         try:
             volume_info = json.loads(stdout)
@@ -175,40 +205,29 @@ def main():
     print("=" * 50)
     print()
     
-    checks_passed = 0
-    checks_failed = 0
-    
-    # 执行各项检查
-    if check_container_status():
-        checks_passed += 1
-    else:
-        checks_failed += 1
-    
-    if check_service_port():
-        checks_passed += 1
-    else:
-        checks_failed += 1
-    
-    model_ok, _ = check_model_downloaded()
-    if model_ok:
-        checks_passed += 1
-    else:
-        checks_failed += 1
-    
-    if check_gpu_support():
-        checks_passed += 1
-    else:
-        checks_failed += 1
+    # 各项检查相互独立，先并发执行全部命令和请求，再按顺序输出结果
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        ps_future = executor.submit(run_command, ["docker", "compose", "ps", "--format", "json", "ollama"])
+        info_future = executor.submit(run_command, CONTAINER_INFO_CMD)
+        volume_future = executor.submit(run_command, ["docker", "volume", "inspect", "second-brain_ollama_data"])
+        tags_future = executor.submit(SESSION.get, OLLAMA_TAGS_URL, timeout=5)
+        generate_future = executor.submit(SESSION.post, OLLAMA_GENERATE_URL, json=GENERATE_PAYLOAD, timeout=30)
+        
+        _, info_stdout, _ = info_future.result()
+        models_output, _, gpu_output = info_stdout.partition(SECTION_SEPARATOR)
+        
+        # 执行各项检查
+        results = [
+            check_container_status(ps_future.result()),
+            check_service_port(tags_future),
+            check_model_downloaded(models_output)[0],
+            check_gpu_support(gpu_output),
+            test_model_response(generate_future),
+            check_data_volume(volume_future.result()),
+        ]
     
-    if test_model_response():
-        checks_passed += 1
-    else:
-        checks_failed += 1
-    
-    if check_data_volume():
-        checks_passed += 1
-    else:
-        checks_failed += 1
+    checks_passed = sum(results)
+    checks_failed = len(results) - checks_passed
     
     # 汇总结果
     print()
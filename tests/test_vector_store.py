@@ -0,0 +1,140 @@
+"""
+向量存储入库去重测试
+
+运行: pytest tests/test_vector_store.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.vector_store import VectorStore
+
+
+class FakeCollection:
+    """模拟 ChromaDB 集合：与 ChromaDB 一样拒绝重复 ID"""
+
+    def __init__(self):
+        self.records = {}
+
+    @staticmethod
+    def _validate_ids(ids):
+        if len(ids) != len(set(ids)):
+            raise ValueError("Expected IDs to be unique")
+
+    def get(self, ids, include):
+        self._validate_ids(ids)
+        return {"ids": [doc_id for doc_id in ids if doc_id in self.records]}
+
+    def upsert(self, embeddings, documents, metadatas, ids):
+        self._validate_ids(ids)
+        assert len(embeddings) == len(documents) == len(metadatas) == len(ids)
+        self.records.update(zip(ids, documents))
+
+
+@pytest.fixture
+def store():
+    store = VectorStore()
+    store.collection = FakeCollection()
+    store.encoded = []
+
+    def fake_embeddings(texts):
+        store.encoded.extend(texts)
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+    store._generate_embeddings = fake_embeddings
+    return store
+
+
+def test_duplicate_texts_in_one_batch(store):
+    """同一批内的重复内容只写入、编码一次，返回的 ID 与输入一一对应"""
+    documents = ["页眉", "正文", "页眉"]
+    ids = store.add_documents(documents, [{}, {}, {}])
+
+    assert len(ids) == 3
+    assert ids[0] == ids[2] != ids[1]
+    assert store.encoded == ["页眉", "正文"]
+    assert len(store.collection.records) == 2
+
+
+def test_reingest_skips_existing(store):
+    """已入库的相同内容再次入库时跳过，不再编码"""
+    store.add_documents(["正文"], [{}])
+    store.encoded.clear()
+
+    ids = store.add_documents(["正文", "新内容", "新内容"], [{}, {}, {}])
+
+    assert len(ids) == 3
+    assert store.encoded == ["新内容"]
+    assert len(store.collection.records) == 2
+
+
+def test_faiss_duplicate_texts_in_one_batch(tmp_path, monkeypatch):
+    """FAISS 后端同样跳过批内和已入库的重复内容"""
+    pytest.importorskip("faiss")
+    from app import faiss_vector_store
+
+    monkeypatch.setattr(faiss_vector_store, "FAISS_INDEX_DIR", tmp_path)
+    store = faiss_vector_store.FAISSVectorStore()
+    store.index = store._new_index(quantized=False)
+    store._generate_embeddings = lambda texts: np.random.rand(len(texts), faiss_vector_store.EMBEDDING_DIMENSION)
+
+    ids = store.add_documents(["页眉", "正文", "页眉"], [{}, {}, {}])
+    assert ids[0] == ids[2] != ids[1]
+    assert store.get_collection_count() == 2
+
+    store.add_documents(["正文", "页眉"], [{}, {}])
+    assert store.get_collection_count() == 2
+
+
+def test_faiss_concurrent_duplicate_add(tmp_path, monkeypatch):
+    """编码期间另一请求写入了相同内容时，不会重复写入"""
+    pytest.importorskip("faiss")
+    from app import faiss_vector_store
+
+    monkeypatch.setattr(faiss_vector_store, "FAISS_INDEX_DIR", tmp_path)
+    store = faiss_vector_store.FAISSVectorStore()
+    store.index = store._new_index(quantized=False)
+    dimension = faiss_vector_store.EMBEDDING_DIMENSION
+
+    def racing_embeddings(texts):
+        # 模拟并发上传：本次编码尚未完成时，另一请求先写入了相同内容
+        store._generate_embeddings = lambda texts: np.random.rand(len(texts), dimension)
+        store.add_documents(["页眉"], [{}])
+        return np.random.rand(len(texts), dimension)
+
+    store._generate_embeddings = racing_embeddings
+    ids = store.add_documents(["页眉", "正文"], [{}, {}])
+
+    assert store.get_collection_count() == 2
+    assert sorted(store.ids) == sorted(ids)
+
+
+def test_faiss_reload_replays_log(tmp_path, monkeypatch):
+    """重启时快照之后追加的数据从日志补回，写入中断留下的不完整行和多余向量被丢弃"""
+    pytest.importorskip("faiss")
+    from app import faiss_vector_store
+
+    monkeypatch.setattr(faiss_vector_store, "FAISS_INDEX_DIR", tmp_path)
+    monkeypatch.setattr(faiss_vector_store.FAISSVectorStore, "_load_embedding_model", lambda self: None)
+    dimension = faiss_vector_store.EMBEDDING_DIMENSION
+
+    store = faiss_vector_store.FAISSVectorStore()
+    store.initialize()
+    store._generate_embeddings = lambda texts: np.random.rand(len(texts), dimension)
+    store.add_documents(["第一段", "第二段"], [{"n": 1}, {"n": 2}])
+    with open(tmp_path / faiss_vector_store.DOCLOG_FILENAME, "a", encoding="utf-8") as f:
+        f.write('{"pos": 2, "id": "tor')
+    with open(tmp_path / faiss_vector_store.VECTORS_FILENAME, "ab") as f:
+        f.write(np.ones((1, dimension), dtype=np.float32).tobytes())
+
+    reloaded = faiss_vector_store.FAISSVectorStore()
+    reloaded.initialize()
+    assert reloaded.get_collection_count() == 2
+    assert reloaded.documents == ["第一段", "第二段"]
+    assert reloaded.metadatas == [{"n": 1}, {"n": 2}]
+    assert len(reloaded._vectors) == 2